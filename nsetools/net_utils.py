@@ -1,20 +1,82 @@
 """
 Contains utility functions related to the internet
 """
+import asyncio
+import io
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import httpx
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from nsetools.utils import byte_adaptor
 
-from urllib.request import build_opener, HTTPCookieProcessor, Request
-from http.cookiejar import CookieJar
+# (connect, read) timeout in seconds
+_TIMEOUT = (3, 10)
+# Seconds for which a response is served from the cache. NSE updates the live lists every few seconds at best
+_CACHE_EXPIRY = 60
 
-def __opener__():
+@lru_cache(maxsize=1)
+def __session__():
+    """
+    Builds a session that keeps connections to NSE alive between requests.
+    The session also holds on to the cookies set by the server, and caches the
+    responses on disk for _CACHE_EXPIRY seconds so that they are shared across processes.
+    The cache lives in the cache directory of the current user, and is only created on the first request.
+    The same session is returned on every call, shared by every request (and every thread)
+    so the TCP/TLS handshake is paid once per host.
+    :returns: requests_cache.CachedSession object
     """
-    Builds the opener for the url
-    :returns: opener object
+    session = requests_cache.CachedSession('nse_cache', backend='sqlite', use_cache_dir=True,
+                                           expire_after=_CACHE_EXPIRY, allowable_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                          max_retries=Retry(total=3, backoff_factor=0.3))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_url(url, headers):
+    """
+    Requests the url and returns the raw body of the response
+    :Parameters:
+    url: str
+        the url to request and read from
+    headers: dict
+        The right set of headers for requesting from http://nseindia.com
+    :returns: bytes of the response body
+    :raises: requests.HTTPError, requests.ConnectionError
     """
+    response = __session__().get(url, headers=headers, timeout=_TIMEOUT)
+    response.raise_for_status()
 
-    cookie_jar = CookieJar()
-    return build_opener(HTTPCookieProcessor(cookie_jar))
+    if response.content is not None:
+        return response.content
+    else:
+        raise Exception('No response received')
+
+
+def stream_url(url, headers):
+    """
+    Requests the url without reading the body, so it can be consumed a piece at a time.
+    The response bypasses the cache, as caching it would mean holding all of it.
+    :Parameters:
+    url: str
+        the url to request and read from
+    headers: dict
+        The right set of headers for requesting from http://nseindia.com
+    :returns: file like object over the (decoded) response body
+    :raises: requests.HTTPError, requests.ConnectionError
+    """
+    response = __session__().get(url, headers=headers, timeout=_TIMEOUT, stream=True,
+                            expire_after=requests_cache.DO_NOT_CACHE)
+    response.raise_for_status()
+    # Undo any gzip/deflate transfer encoding while reading
+    response.raw.decode_content = True
+    return response.raw
 
 
 def read_url(url, headers):
@@ -26,12 +88,49 @@ def read_url(url, headers):
     headers: dict
         The right set of headers for requesting from http://nseindia.com
     :returns: _io.StringIO object of the response
+    :raises: requests.HTTPError, requests.ConnectionError
     """
-    request = Request(url, None, headers)
-    response = __opener__().open(request)
+    return byte_adaptor(io.BytesIO(fetch_url(url, headers)))
 
-    if response is not None:
-        return byte_adaptor(response)
-    else:
-        raise Exception('No response received')
 
+async def read_urls(urls, headers):
+    """
+    Requests all the urls concurrently over a single pool of keep-alive connections
+    :Parameters:
+    urls: iterable of str
+        the urls to request and read from
+    headers: dict
+        The right set of headers for requesting from http://nseindia.com
+    :returns: list of _io.StringIO objects, in the same order as urls
+    :raises: httpx.HTTPStatusError, httpx.TransportError
+    """
+    limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    timeout = httpx.Timeout(_TIMEOUT[1], connect=_TIMEOUT[0])
+    # Follow redirects, the same as the requests session does
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=timeout, headers=headers,
+                                 follow_redirects=True) as client:
+        responses = await asyncio.gather(*(client.get(url) for url in urls))
+
+    string_buffers = []
+    for response in responses:
+        response.raise_for_status()
+        string_buffers.append(byte_adaptor(io.BytesIO(response.content)))
+    return string_buffers
+
+
+def run_coroutine(coroutine):
+    """
+    Runs the coroutine to completion from synchronous code and returns its result.
+    asyncio.run cannot be used while an event loop is already running in this thread
+    (Jupyter, async applications), in that case the coroutine gets its own loop on a worker thread.
+    :Parameters:
+    coroutine: coroutine object
+        the coroutine to run
+    :returns: whatever the coroutine returns
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
@@ -1,23 +1,79 @@
 """
 Contains the core APIs
 """
-import ast, re, json, os, sys, inspect, csv
+import re, json, io, os, sys, inspect, csv
 
-from urllib.request import build_opener, HTTPCookieProcessor, Request
 from urllib.parse import urlencode
-from http.cookiejar import CookieJar
-from tempfile import gettempdir
-from functools import lru_cache
-from dateutil.parser import parse
-from datetime import date, timedelta, datetime
-from multiprocessing.pool import ThreadPool
+from tempfile import mkstemp
+from functools import lru_cache, wraps
+from datetime import date, time, datetime
 
-from bs4 import BeautifulSoup
+from lxml import etree
+from platformdirs import user_cache_dir
 
+import orjson
+
+import numpy as np
 import pandas as pd
 
-from nsetools.utils import js_adaptor, save_file
-from nsetools.net_utils import read_url
+from nsetools.utils import json_adaptor, save_file
+from nsetools.net_utils import fetch_url, read_url, read_urls, run_coroutine, stream_url
+
+# Patterns used while scraping the server responses. Compiled once, these run on every request.
+_QUOTE_RE = re.compile(r'\{<div\s+id="responseDiv"\s+style="display:none">\s+(\{.*?\{.*?\}.*?\})', re.S)
+_PEER_DATA_RE = re.compile('data:')
+_NUM_RE = re.compile(r'^[-]?[0-9,.]+$')
+
+def _load_json(res):
+    """
+    Decoder for all the json responses, orjson does the parsing in C.
+    orjson only accepts valid UTF-8 bytes, so the body is decoded as latin-1 first, the same as read_url does.
+    :param res: bytes of the response body
+    :return: the parsed json
+    """
+    return orjson.loads(res.decode('latin-1'))
+
+# The right set of headers for requesting http://nseindia.com
+_HEADERS = {'Accept': '*/*',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Host': 'nseindia.com',
+            'Referer': "https://www.nseindia.com/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp?symbol=INFY&illiquid=0&smeFlag=0&itpFlag=0",
+            'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:28.0) Gecko/20100101 Firefox/28.0',
+            'X-Requested-With': 'XMLHttpRequest'
+            }
+
+# The top lists differ only in where they are fetched from and the column they are indexed on.
+# kind -> (name of the url attribute on Nse, index column)
+_TOP_ENDPOINTS = {
+    'gainers': ('top_gainer_url', 'symbol'),
+    'losers': ('top_loser_url', 'symbol'),
+    'volume': ('top_volume_url', 'sym'),
+    'active': ('most_active_url', 'symbol'),
+    'advances declines': ('advances_declines_url', 'indice')
+    }
+
+# Layout of EQUITY_L.csv
+_STOCK_CODES_CSV_OPTIONS = {
+    'header': 0,
+    'names': ['Symbol', 'Name', 'Series', 'Date of Listing', 'Paid up Value', 'Market Lot', 'ISIN Number', 'Face Value'],
+    'dtype': {'Symbol': 'string', 'Name': 'string', 'Series': 'category', 'ISIN Number': 'string'},
+    'parse_dates': ['Date of Listing'],
+    # e.g. 06-OCT-2008. Without it pandas falls back to dateutil, one element at a time
+    'date_format': '%d-%b-%Y',
+    'encoding': 'latin-1',
+    'engine': 'c'
+    }
+
+# Per user directory for the data cached on disk
+_CACHE_DIR = user_cache_dir('nsetools')
+
+# Format of the dates on the holiday page
+_HOLIDAY_DATE_FORMAT = '%d-%b-%Y'
+
+# The market opens at 9:15 am
+MARKET_OPEN = time(9, 15)
+# And ends at 3:30 = 15:30
+MARKET_CLOSE = time(15, 30)
 
 class NseHolidays():
     """
@@ -26,6 +82,7 @@ class NseHolidays():
     def get_holiday_list(self):
         """
         Cleans the holiday list
+        :Returns: frozenset of the dates (trading holidays and weekends) on which the market is closed, from today till the end of the year
         """
         holiday_list = self.__parse_holiday_list__()
         clean_holiday_list = []
@@ -44,56 +101,98 @@ class NseHolidays():
         for  series in clean_holiday_list:
             # We wish to extract only the trading holidays. The serial number resets after trading holidays i.e when it moves to clearing holidays
             if previous < int(series[0][0]):
-                # Convert to datetime format
-                parsed_date = parse(series[1][0])
+                # Convert to datetime format. The dates on the page are laid out as 26-Jan-2018
+                parsed_date = datetime.strptime(series[1][0].strip(), _HOLIDAY_DATE_FORMAT)
                 if todays_date <= parsed_date.date():
                     holiday_list.append(parsed_date.date())
                 previous += 1
 
-        # We will now extract the saturdays and sundays
-        d = todays_date
-        d += timedelta(days=6-d.weekday())
-        s = d - timedelta(days=1)
-        while d.year == todays_date.year:
-            holiday_list.append(s)
-            holiday_list.append(d)
-            d += timedelta(days=7)
-            s += timedelta(days=7)
+        # We will now extract the saturdays and sundays till the end of the year.
+        # The days are plain integer day counts from 1970-01-01 (a Thursday, weekday 3),
+        # so the weekday of all of them is a single modulo, with no per date branching
+        all_days = np.arange(np.datetime64(todays_date, 'D'), np.datetime64(date(todays_date.year + 1, 1, 1), 'D'))
+        weekdays = (all_days.astype(np.int64) + 3) % 7
+        holiday_list.extend(all_days[weekdays >= 5].tolist())
 
         # This is the final holiday list from the current time.
-        return holiday_list
+        # A frozenset, as this is only ever used for membership tests
+        return frozenset(holiday_list)
 
     @lru_cache(maxsize=2)
     def __parse_holiday_list__(self):
         """
         :Returns: a list of all the holidays with the serial number, date and holiday name
         """
+        # The list only changes once a year, a fresh copy on disk saves the network round trip
+        # It is kept in the cache directory of the current user, a shared location could be planted by anyone
+        cache_path = os.path.join(_CACHE_DIR, 'nse_holidays_{}.json'.format(datetime.now().year))
+        try:
+            if datetime.now().timestamp() - os.path.getmtime(cache_path) < 24 * 60 * 60:
+                with open(cache_path, encoding='utf8') as f:
+                    return json.load(f)
+        except (OSError, ValueError):
+            # Missing, unreadable or corrupt cache, fetch it again
+            pass
+
         # Parse the holiday url and extract useful details
         holiday_url = 'https://www.nseindia.com/products/content/equities/equities/mrkt_timing_holidays.htm'
-        headers = {'Accept': '*/*',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Host': 'nseindia.com',
-                'Referer': "https://www.nseindia.com/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp?symbol=INFY&illiquid=0&smeFlag=0&itpFlag=0",
-                'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:28.0) Gecko/20100101 Firefox/28.0',
-                'X-Requested-With': 'XMLHttpRequest'
-                }
-        res = read_url(holiday_url, headers)
-        res = res.read()
-        
-        soup = BeautifulSoup(res, 'html.parser')
+        res = fetch_url(holiday_url, _HEADERS)
+
         holiday_list = []
-        # The data is stored in tables. Extract only the tabular data
-        for row in soup.find_all('tr', recursive=False):
-            record = [td.text.replace(',', '') for td in row.find_all('td')]
-            holiday_list.append(record)
+        # The data is stored in tables. Stream through the rows, no tree is built for the rest of the page
+        for _, row in etree.iterparse(io.BytesIO(res), tag='tr', html=True):
+            record = [''.join(td.itertext()).replace(',', '') for td in row.findall('td')]
+            # The page has other tables too (e.g. market timings), and header rows only have <th> cells.
+            # Only the holiday rows start with a serial number, skip everything else
+            if record and record[0].strip().isdigit():
+                holiday_list.append(record)
+            # Free the row we are done with
+            row.clear()
+
+        # The cache is only an optimisation, failing to write it must not fail the fetch.
+        # Write to a temporary file and swap it in, so that readers never see a partial file
+        try:
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            fd, temp_path = mkstemp(dir=_CACHE_DIR, prefix='nse_holidays_', suffix='.tmp')
+            try:
+                with open(fd, 'w', encoding='utf8') as f:
+                    json.dump(holiday_list, f)
+                os.replace(temp_path, cache_path)
+            except OSError:
+                os.remove(temp_path)
+                raise
+        except OSError:
+            pass
 
         return holiday_list
 
-def conditional_decorator(decorator, condition):
+def cached_when_closed(maxsize=64):
+    """
+    Caches the results of the decorated function, but only while the market is closed.
+    The status of the market is checked on every call, and the cache is dropped as soon as
+    a new closed period (pre open / post close on a given day) starts, so stale data is never served.
+    :Parameters:
+    maxsize: int
+        The maximum number of results to hold on to
+    """
     def res_decorator(f):
-        if not condition:
-            return f
-        return decorator(f)
+        cached = lru_cache(maxsize=maxsize)(f)
+        # The closed period in which the cache was filled
+        filled_in = [None]
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if market_status():
+                return f(*args, **kwargs)
+            now = datetime.now()
+            closed_period = (now.date(), now.time() >= MARKET_CLOSE)
+            if closed_period != filled_in[0]:
+                cached.cache_clear()
+                filled_in[0] = closed_period
+            return cached(*args, **kwargs)
+
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
     return res_decorator
 
 def market_status():
@@ -101,21 +200,26 @@ def market_status():
     Checks whether the market is open or not
     :returns: bool variable indicating status of market. True -> Open, False -> Closed
     """
+    now = datetime.now()
+    # The status can only change at a minute boundary, so the minute is enough to key the memo on
+    return __market_status__(now.date(), now.hour, now.minute)
+
+@lru_cache(maxsize=1)
+def __market_status__(today, hour, minute):
+    """
+    Computes the status of the market for the given minute of the day.
+    Use market_status instead of calling this directly.
+    """
     nse_holidays = NseHolidays()
     holiday_list = nse_holidays.get_holiday_list()
 
     # Check if today is a holiday according to the holiday list.
-    if datetime.now().date() in holiday_list:
+    if today in holiday_list:
         return False
 
-    current_time = datetime.now().time()
+    current_time = time(hour, minute)
     # Check if the current time is in the time bracket in which NSE operates.
-    # The market opens at 9:15 am
-    start_time = datetime.now().time().replace(hour=9, minute=15, second=0, microsecond=0)
-    # And ends at 3:30 = 15:30
-    end_time = datetime.now().time().replace(hour=15, minute=30, second=0, microsecond=0)
-
-    if current_time > start_time and current_time < end_time:
+    if MARKET_OPEN <= current_time < MARKET_CLOSE:
         return True
 
     # In case the above condition does not satisfy, the default value (False) is returned
@@ -126,15 +230,11 @@ class Nse():
     class which implements all the functionality for
     National Stock Exchange
     """
-    __CODECACHE__ = None
-    __cache_size__ = 64
-
-
     def __init__(self, cache_size=64):
         """
         Initializes a new instance of the Nse class.
         :Parameters:
-            file_caching: (optional) bool variable to indicate whether to use files for caching of non changing data
+            cache_size: (optional) int, the maximum number of results each cached method of this instance holds on to
         """
         self.headers = self.nse_headers()
         # URL list
@@ -148,100 +248,98 @@ class Nse():
         self.index_url = "http://www.nseindia.com/homepage/Indices1.json"
         self.peer_companies_url = 'https://nseindia.com/live_market/dynaContent/live_watch/get_quote/ajaxPeerCompanies.jsp?symbol='
 
-        self.__cache_size__ = cache_size
+        # The caches are wired per instance. Decorating in the class body would fix their size
+        # when the class is defined, and share a single cache (holding on to every self) across instances
+        per_instance_caches = {
+            '__stock_codes__': lru_cache(maxsize=cache_size),
+            '__symbol_set__': lru_cache(maxsize=1),
+            'get_quote': cached_when_closed(maxsize=cache_size),
+            'get_peer_companies': lru_cache(maxsize=cache_size),
+            'get_index_list': lru_cache(maxsize=cache_size),
+            'is_valid_index': lru_cache(maxsize=cache_size),
+            # There are only a couple of thousand codes, this ends up holding all of them
+            'build_url_for_quote': lru_cache(maxsize=4096),
+        }
+        for method_name, cache in per_instance_caches.items():
+            setattr(self, method_name, cache(getattr(self, method_name)))
 
-    @lru_cache(maxsize=__cache_size__)
-    def get_stock_codes(self, cached=True):
+    def get_stock_codes(self, cached=True, chunksize=None):
         """
         Retreives the equity list from NSE, and stores it in a dataframe.
         
         :Parameters:
         cached: bool
             Whether to cache the data or not. Prefer keeping this true unless you are running into OOM issues.
-        as_json = 
-        :return: pandas DataFrame
+        chunksize: int
+            When given, the csv is streamed from NSE and read chunksize rows at a time, so that only a single chunk is held in memory. Such a read is never cached.
+        :return: pandas DataFrame | iterator of pandas DataFrames when chunksize is given
+        """
+        if chunksize is not None:
+            return pd.read_csv(stream_url(self.stocks_csv_url, self.headers),
+                               chunksize=chunksize, **_STOCK_CODES_CSV_OPTIONS)
+        return self.__stock_codes__()
+
+    def __stock_codes__(self):
+        """
+        :return: pandas DataFrame of the whole equity list
         """
-        res_dataframe = pd.DataFrame()
         url = self.stocks_csv_url
-        res = read_url(url, self.headers)
-        column_dict = {
-            0: 'Symbol',
-            1: 'Name',
-            2: 'Series',
-            3: 'Date of Listing',
-            4: 'Paid up Value',
-            5: 'Market Lot',
-            6: 'ISIN Number',
-            7: 'Face Value'
-            }
-        for i, line in enumerate(res.read().split('\n')):
-            if i == 0:
-                # This contains the column names
-                pass
-            elif line != '' and re.search(',', line):
-                split_line = line.split(',')
-                for index, items in enumerate(split_line):
-                    res_dataframe.set_value(i, column_dict[index], items)
-
-            # else just skip the evaluation, line may not be a valid csv
-        return res_dataframe
-            
-
-    @lru_cache(maxsize=__cache_size__)
+        res = fetch_url(url, self.headers)
+        # The C parser handles quoted commas, and known dtypes save it the inference
+        return pd.read_csv(io.BytesIO(res), **_STOCK_CODES_CSV_OPTIONS)
+
+    def __symbol_set__(self):
+        """
+        :return: frozenset of all the stock codes, for constant time lookups
+        """
+        return frozenset(self.get_stock_codes()['Symbol'].tolist())
+
     def is_valid_code(self, code):
         """
         :param code: a string stock code
         :return: bool
         """
-        if code:
-            stock_codes = self.get_stock_codes()
-            search_result = stock_codes[stock_codes['Symbol'] == code.upper()]
-            if not search_result.empty:
-                return True
-            return False
+        return bool(code) and code.upper() in self.__symbol_set__()
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
     def get_quote(self, *codes, as_json=False):
         """
         gets the quote for a given stock code
         :param codes: 
         :return: pandas DataFrame with quotes of all companies codes passed.
-        :raises: HTTPError, URLError
-        """
-        def __get_quote__(code):
-            code = code.upper()
-            if self.is_valid_code(code):
-                url = self.build_url_for_quote(code)
-                res = read_url(url, self.headers)
-
-                # Now parse the response to get the relevant data
-                match = re.search(
-                    r'\{<div\s+id="responseDiv"\s+style="display:none">\s+(\{.*?\{.*?\}.*?\})',
-                    res.read(), re.S
-                )
-                # ast can raise SyntaxError, let's catch only this error
-                try:
-                    buffer = match.group(1)
-                    buffer = js_adaptor(buffer)
-                    response = self.clean_server_response(
-                        ast.literal_eval(buffer)['data'][0])
-                except Exception as err:
-                    raise Exception('Symbol Not Traded today')
-                else:
-                    rendered_response = self.render_response(response, as_json)
-                    # Check if the market is open (to avoid repeated network computation)
-                return rendered_response
-        with ThreadPool(os.cpu_count()*2) as pool:
-            quotes = pool.map(__get_quote__, codes)
+        :raises: HTTPError, ConnectionError
+        """
+        def __parse_quote__(res):
+            # Now parse the response to get the relevant data
+            match = _QUOTE_RE.search(res.read())
+            # orjson raises JSONDecodeError on a malformed buffer
+            try:
+                buffer = match.group(1)
+                buffer = json_adaptor(buffer)
+                response = self.clean_server_response(
+                    orjson.loads(buffer)['data'][0])
+            except Exception as err:
+                raise Exception('Symbol Not Traded today')
+            else:
+                rendered_response = self.render_response(response, as_json)
+            return rendered_response
+
+        codes = [code.upper() for code in codes]
+        valid_codes = [code for code in codes if self.is_valid_code(code)]
+        # The requests are IO bound, fire all of them at once and parse once they are back
+        responses = run_coroutine(read_urls(
+            [self.build_url_for_quote(code) for code in valid_codes], self.headers))
+        responses = dict(zip(valid_codes, responses))
+        # Invalid codes get a None, same as before
+        quotes = [__parse_quote__(responses[code]) if code in responses else None
+                  for code in codes]
         if as_json:
             return quotes
         # Filter out all the Nones from the list
         quotes = [x for x in quotes if x is not None]
         if quotes:
-            return pd.DataFrame(quotes).set_index('symbol')
+            return pd.DataFrame.from_records(quotes, index='symbol')
 
 
-    @lru_cache(maxsize=__cache_size__)
     def get_peer_companies(self, code, as_json=False):
         """
         :Parameters:
@@ -256,31 +354,15 @@ class Nse():
             url = self.peer_companies_url + code
             res = read_url(url, self.headers)
 
-            # We need to filter the data from this. The data is at an offset of 39 from the beginning and 8 at the end
             res = res.read()
-            string_index = re.search('data:', res).span()[1]
-            # Everything under 'data'
-            res = res[string_index+1:]
-            # Now comes the tricky batshit crazy part.
-            # We will iteratively filter each company and append them to a list
-            # HACK: the solution is very messy. Would be nice if a better cleaner solution can be found.
-            start = 0
-            data = pd.DataFrame()
-            for item in re.finditer(r'({*})', res):
-                # The second item. We want the curly brace for json parsing
-                end = item.span()[1]
-                # This is the actual data we are interested in
-                string = res[start:end]
-                try:
-                    company_info = json.loads(string)
-                    del(company_info['industry'])
-                    data = data.append(company_info, ignore_index=True)
-                except :
-                    pass
-                # We dont care about this. Throw it out
-                start = end + 1
-
-            return data
+            string_index = _PEER_DATA_RE.search(res).span()[1]
+            # Everything under 'data' is a json array of the companies, parse it in one go.
+            # raw_decode stops at the end of the array and ignores whatever trails it
+            records, _ = json.JSONDecoder().raw_decode(res[string_index:].lstrip())
+            # Leave out the industry column while building, rather than copying the frame to drop it.
+            # from_records raises on an excluded column that is not there, e.g. for an empty payload
+            exclude = ['industry'] if any('industry' in record for record in records) else None
+            return pd.DataFrame.from_records(records, exclude=exclude)
 
     def get_top(self, *options, as_json=False):
         """
@@ -305,92 +387,60 @@ class Nse():
             if function_to_call is not None:
                 yield function_to_call(as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
-    def get_top_gainers(self, as_json=False):
+    def __get_top__(self, kind, as_json=False):
         """
-        :return: pandas DataFrame | JSON containing top gainers of the day
+        Fetches and cleans one of the top lists in _TOP_ENDPOINTS
+        :Parameters:
+        kind: str
+            The list to fetch, a key of _TOP_ENDPOINTS
+        as_json: bool
+            Whether to render the response as json
+        :return: pandas DataFrame | JSON of the list
+        :raises: ConnectionError, HTTPError
         """
-        url = self.top_gainer_url
-        res = read_url(url, self.headers)
-        res_dict = json.load(res)
+        url_attribute, index_column = _TOP_ENDPOINTS[kind]
+        url = getattr(self, url_attribute)
+        res = fetch_url(url, self.headers)
+        res_dict = _load_json(res)
         # clean the output and make appropriate type conversions
-        res_list = [self.clean_server_response(
-            item) for item in res_dict['data']]
+        res_list = [self.clean_server_response(item) for item in res_dict['data']]
         response = self.render_response(res_list, as_json)
         if as_json:
             return response
         else:
-            return pd.DataFrame(response).set_index('symbol')
+            return pd.DataFrame.from_records(response, index=index_column)
+
+    def get_top_gainers(self, as_json=False):
+        """
+        :return: pandas DataFrame | JSON containing top gainers of the day
+        """
+        return self.__get_top__('gainers', as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
     def get_top_losers(self, as_json=False):
         """
         :return: pandas DataFrame | JSON containing top losers of the day
         """
-        url = self.top_loser_url
-        res = read_url(url, self.headers)
-        res_dict = json.load(res)
-        # clean the output and make appropriate type conversions
-        res_list = [self.clean_server_response(item)
-                    for item in res_dict['data']]
-        response = self.render_response(res_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('symbol')
+        return self.__get_top__('losers', as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
     def get_top_volume(self, as_json=False):
         """
         :return: pandas DataFrame | JSON containing top volume gainers of the day
         """
-        url = self.top_volume_url
-        res = read_url(url, self.headers)
-        res_dict = json.load(res)
-        # clean the output and make appropriate type conversions
-        res_list = [self.clean_server_response(
-            item) for item in res_dict['data']]
-        response = self.render_response(res_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('sym')
+        return self.__get_top__('volume', as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
     def get_most_active(self, as_json=False):
         """
         :return: pandas DataFrame | JSON containing most active equites of the day
         """
-        url = self.most_active_url
-        res = read_url(url, self.headers)
-        res_dict = json.load(res)
-        # clean the output and make appropriate type conversions
-        res_list = [self.clean_server_response(
-            item) for item in res_dict['data']]
-        response = self.render_response(res_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('symbol')
+        return self.__get_top__('active', as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
     def get_advances_declines(self, as_json=False):
         """
         :return: pandas DataFrame | JSON with advance decline data
-        :raises: URLError, HTTPError
-        """
-        url = self.advances_declines_url
-        resp = read_url(url, self.headers)
-        resp_dict = json.load(resp)
-        resp_list = [self.clean_server_response(item)
-                     for item in resp_dict['data']]
-        response = self.render_response(resp_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('indice')
+        :raises: ConnectionError, HTTPError
+        """
+        return self.__get_top__('advances declines', as_json)
 
-    @lru_cache(maxsize=__cache_size__)
     def get_index_list(self, as_json=False):
         """
         get list of indices and codes
@@ -398,13 +448,12 @@ class Nse():
         returns: a list | json of index codes
         """
         url = self.index_url
-        resp = read_url(url, self.headers)
-        resp_list = json.load(resp)['data']
+        resp = fetch_url(url, self.headers)
+        resp_list = _load_json(resp)['data']
         index_list = [str(item['name']) for item in resp_list]
         return self.render_response(index_list, as_json)
         
 
-    @lru_cache(maxsize=__cache_size__)
     def is_valid_index(self, code):
         """
         returns: True | Flase , based on whether code is valid
@@ -412,7 +461,6 @@ class Nse():
         index_list = self.get_index_list()
         return True if code.upper() in index_list else False
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
     def get_index_quote(self, code, as_json=False):
         """
         params:
@@ -423,8 +471,8 @@ class Nse():
         """
         url = self.index_url
         if self.is_valid_index(code):
-            resp = read_url(url, self.headers)
-            resp_list = json.load(resp)['data']
+            resp = fetch_url(url, self.headers)
+            resp_list = _load_json(resp)['data']
             # this is list of dictionaries
             resp_list = [self.clean_server_response(item)
                          for item in resp_list]
@@ -441,13 +489,8 @@ class Nse():
         Builds right set of headers for requesting http://nseindia.com
         :return: a dict with http headers
         """
-        return {'Accept': '*/*',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Host': 'nseindia.com',
-                'Referer': "https://www.nseindia.com/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp?symbol=INFY&illiquid=0&smeFlag=0&itpFlag=0",
-                'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:28.0) Gecko/20100101 Firefox/28.0',
-                'X-Requested-With': 'XMLHttpRequest'
-                }
+        # A copy, so that changing the headers of one instance does not change them for all
+        return dict(_HEADERS)
 
     def build_url_for_quote(self, code):
         """
@@ -479,16 +522,17 @@ class Nse():
             if type(value) is str:
                 if '-' == value:
                     resp_dict[key] = None
-                elif re.search(r'^[-]?[0-9,.]+$', value):
+                elif _NUM_RE.search(value):
                     # replace , to '', and type cast to int
-                    resp_dict[key] = float(re.sub(',', '', value))
+                    resp_dict[key] = float(value.replace(',', ''))
                 else:
                     resp_dict[key] = str(value)
         return resp_dict
 
     def render_response(self, data, as_json=False):
         if as_json is True:
-            return json.dumps(data)
+            # numpy scalars can end up in the data when it comes out of a DataFrame
+            return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode()
         else:
             return data
 
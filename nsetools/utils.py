@@ -7,6 +7,9 @@ import io
 import os
 import pandas as pd
 
+# Bare (unquoted) javascript literals
+_JS_NAN_RE = re.compile(r'(?<!")\bNaN\b(?!")')
+_JS_NONE_RE = re.compile(r'(?<!")\bnone\b(?!")')
 
 def byte_adaptor(fbuffer):
     """
@@ -41,6 +44,22 @@ def js_adaptor(buffer):
     buffer = re.sub('NaN', '"NaN"', buffer)
     return buffer
 
+def json_adaptor(buffer):
+    """
+    convert the non standard javascript literals in a json like
+    string, so that it can be parsed by a strict json parser.
+    NaN is quoted, to stay in line with js_adaptor.
+
+    Arguments:
+        buffer: string to be converted
+
+    Returns:
+        string after conversion
+    """
+    buffer = _JS_NAN_RE.sub('"NaN"', buffer)
+    buffer = _JS_NONE_RE.sub('null', buffer)
+    return buffer
+
 def save_file(dataframe, extension, **options):
     """
     Saves the dataframe to the specified location
@@ -8,10 +8,18 @@ import logging
 import json
 import re
 import six
+import asyncio
+import threading
+import tempfile
+import warnings
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from nsetools import Nse
-from nsetools.utils import js_adaptor, byte_adaptor, save_file
-from nsetools.nse import market_status
+from nsetools.net_utils import read_urls, run_coroutine
+from nsetools.utils import js_adaptor, json_adaptor, byte_adaptor, save_file
+from nsetools.nse import market_status, cached_when_closed, NseHolidays
 from tempfile import gettempdir
+from datetime import date, datetime
 
 log = logging.getLogger('nse')
 logging.basicConfig(level=logging.DEBUG)
@@ -27,6 +35,9 @@ class TestCoreAPIs(unittest.TestCase):
     def test_nse_headers(self):
         ret = self.nse.nse_headers()
         self.assertIsInstance(ret, dict)
+        # Each instance gets its own copy
+        self.nse.headers['User-Agent'] = 'nsetools'
+        self.assertNotEqual(Nse().headers['User-Agent'], 'nsetools')
 
     def test_build_url_for_quote(self):
         test_code = 'infy'
@@ -49,6 +60,21 @@ class TestCoreAPIs(unittest.TestCase):
         response = self.nse.get_peer_companies(code)
         self.assertIsInstance(response, pd.DataFrame)
 
+    def test_get_peer_companies_payload(self):
+        # (peer code, payload, expected columns). Distinct codes, as the results are cached per code
+        cases = [
+            ('EMPTY', '', []),
+            ('WITHINDUSTRY', '{"symbol":"INFY","industry":"IT"},{"symbol":"TCS","industry":"IT"}', ['symbol']),
+            ('NOINDUSTRY', '{"symbol":"INFY"}', ['symbol'])
+        ]
+        for code, payload, columns in cases:
+            res = six.StringIO('({data:[' + payload + ']})')
+            with mock.patch('nsetools.nse.read_url', return_value=res), \
+                    mock.patch.object(self.nse, 'is_valid_code', return_value=True):
+                response = self.nse.get_peer_companies(code)
+            self.assertIsInstance(response, pd.DataFrame)
+            self.assertListEqual(list(response.columns), columns)
+
     def test_market_status(self):
         result = market_status()
         self.assertIsInstance(result, bool)
@@ -93,6 +119,41 @@ class TestCoreAPIs(unittest.TestCase):
         if sc.empty:
             self.fail()
 
+    def test_get_top_parsing(self):
+        data = {'data': [{'symbol': 'INFY', 'vol': 100, 'ltp': '1,000.50', 'change': '-'},
+                         {'symbol': 'TCS', 'ltp': '10', 'extra': 'x'}]}
+        with mock.patch('nsetools.nse.fetch_url', return_value=json.dumps(data).encode()):
+            json_resp = self.nse.get_top_gainers(as_json=True)
+            frame = self.nse.get_top_gainers()
+        self.assertListEqual(json.loads(json_resp), [
+            {'symbol': 'INFY', 'vol': 100, 'ltp': 1000.50, 'change': None},
+            {'symbol': 'TCS', 'ltp': 10.0, 'extra': 'x'}
+        ])
+        # Integers stay integers in the json
+        self.assertIn('"vol":100,', json_resp)
+        self.assertListEqual(list(frame.index), ['INFY', 'TCS'])
+        self.assertEqual(frame['ltp'].dtype, float)
+        self.assertEqual(frame.loc['INFY', 'vol'], 100)
+
+    def test_get_top_non_utf8(self):
+        # Bodies are decoded as latin-1, a byte that is not valid UTF-8 must not break the parse
+        body = b'{"data":[{"symbol":"INFY","name":"Soci\xe9t\xe9","ltp":"10"}]}'
+        with mock.patch('nsetools.nse.fetch_url', return_value=body):
+            frame = self.nse.get_top_gainers()
+        self.assertEqual(frame.loc['INFY', 'name'], 'Soci\xe9t\xe9')
+        self.assertEqual(frame.loc['INFY', 'ltp'], 10.0)
+
+    def test_get_stock_codes_parsing(self):
+        csv = (b'SYMBOL,NAME OF COMPANY, SERIES, DATE OF LISTING, PAID UP VALUE, MARKET LOT, ISIN NUMBER, FACE VALUE\n'
+               b'20MICRONS,"20 Microns, Limited",EQ,06-OCT-2008,5,1,INE144J01027,5\n'
+               b'3IINFOTECH,3i Infotech Limited,EQ,22-APR-2005,10,1,INE748C01020,10\n')
+        with mock.patch('nsetools.nse.fetch_url', return_value=csv), warnings.catch_warnings():
+            warnings.simplefilter('error')
+            sc = self.nse.get_stock_codes()
+        self.assertEqual(sc['Name'][0], '20 Microns, Limited')
+        self.assertEqual(sc['Date of Listing'][0], pd.Timestamp(2008, 10, 6))
+        self.assertEqual(sc['Date of Listing'][1], pd.Timestamp(2005, 4, 22))
+
 # TODO: use mock and create one test where response contains a blank line
 # TODO: use mock and create one test where response doesnt contain a csv
 # TODO: use mock and create one test where return is null
@@ -206,6 +267,13 @@ class TestCoreAPIs(unittest.TestCase):
         ret = js_adaptor(buffer)
         self.assertEqual(ret, expected_buffer)
 
+    def test_json_adaptor(self):
+        buffer = '{"abc":true, "def":false, "ghi":NaN, "jkl":none, "mno":"NaN"}'
+        expected_buffer = '{"abc":true, "def":false, "ghi":"NaN", "jkl":null, "mno":"NaN"}'
+        ret = json_adaptor(buffer)
+        self.assertEqual(ret, expected_buffer)
+        self.assertDictEqual(json.loads(ret), {'abc': True, 'def': False, 'ghi': 'NaN', 'jkl': None, 'mno': 'NaN'})
+
     def test_byte_adaptor(self):
         from io import BytesIO
         buffer = b'nsetools'
@@ -236,5 +304,153 @@ class TestCoreAPIs(unittest.TestCase):
         if not os.path.exists(path):
             self.fail()
 
+def frozen_datetime(moment):
+    """
+    :returns: a datetime class whose now() always is moment, to patch over nsetools.nse.datetime
+    """
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return moment
+    return FrozenDatetime
+
+class TestCachedWhenClosed(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+        @cached_when_closed(maxsize=4)
+        def fetch(code):
+            self.calls += 1
+            return self.calls
+        self.fetch = fetch
+
+    def call_at(self, moment, is_open):
+        with mock.patch('nsetools.nse.datetime', frozen_datetime(moment)), \
+                mock.patch('nsetools.nse.market_status', return_value=is_open):
+            return self.fetch('INFY')
+
+    def test_caching_across_a_day(self):
+        # Pre open, the result is cached
+        self.assertEqual(self.call_at(datetime(2022, 12, 26, 8, 0), False), 1)
+        self.assertEqual(self.call_at(datetime(2022, 12, 26, 9, 0), False), 1)
+        # While open every call goes through
+        self.assertEqual(self.call_at(datetime(2022, 12, 26, 10, 0), True), 2)
+        self.assertEqual(self.call_at(datetime(2022, 12, 26, 10, 1), True), 3)
+        # At close the pre open result is dropped
+        self.assertEqual(self.call_at(datetime(2022, 12, 26, 15, 30), False), 4)
+        self.assertEqual(self.call_at(datetime(2022, 12, 26, 20, 0), False), 4)
+        # And again on the next day
+        self.assertEqual(self.call_at(datetime(2022, 12, 27, 8, 0), False), 5)
+        self.assertEqual(self.call_at(datetime(2022, 12, 27, 8, 1), False), 5)
+
+    def test_clearing_at_close_without_calls_while_open(self):
+        self.assertEqual(self.call_at(datetime(2022, 12, 26, 8, 0), False), 1)
+        self.assertEqual(self.call_at(datetime(2022, 12, 26, 16, 0), False), 2)
+
+class TestNseHolidays(unittest.TestCase):
+    page = (b'<html><body><table><tr><th>Sr. No</th><th>Date</th><th>Description</th></tr>'
+            b'<tr><td>1</td><td>26-Dec-2022</td><td>Holiday</td></tr></table></body></html>')
+
+    def holiday_list_on(self, today, rows):
+        with mock.patch('nsetools.nse.datetime', frozen_datetime(today)), \
+                mock.patch.object(NseHolidays, '__parse_holiday_list__', return_value=rows):
+            return NseHolidays().get_holiday_list()
+
+    def test_get_holiday_list_weekends(self):
+        # 2022-12-25 is a sunday, and the year ends on a saturday
+        holiday_list = self.holiday_list_on(datetime(2022, 12, 25, 10, 0), [['1', '26-Dec-2022', 'Holiday']])
+        self.assertEqual(holiday_list, frozenset([date(2022, 12, 25), date(2022, 12, 26), date(2022, 12, 31)]))
+
+        # On a saturday, both days of the weekend are in
+        holiday_list = self.holiday_list_on(datetime(2022, 12, 24, 10, 0), [])
+        self.assertEqual(holiday_list, frozenset([date(2022, 12, 24), date(2022, 12, 25), date(2022, 12, 31)]))
+
+        # Holidays in the past are left out, and the weeks of the rest of the year are all there
+        holiday_list = self.holiday_list_on(datetime(2022, 1, 3, 10, 0), [['1', '01-Jan-2022', 'Holiday']])
+        # 2022 has 53 saturdays and 52 sundays, less the first weekend
+        self.assertEqual(len(holiday_list), 103)
+        self.assertTrue(all(day.weekday() >= 5 for day in holiday_list))
+
+    def test_get_holiday_list_skips_other_tables(self):
+        page = (b'<html><body><table><tr><th>Session</th><th>Timing</th></tr>'
+                b'<tr><td>Normal Market Open</td><td>09:15 hrs</td></tr>'
+                b'<tr><td>Normal Market Close</td><td>15:30 hrs</td></tr></table>'
+                b'<table><tr><th>Sr. No</th><th>Date</th><th>Description</th></tr>'
+                b'<tr><td>1</td><td>26-Dec-2022</td><td>Holiday</td></tr></table></body></html>')
+        # No disk cache, the page has to be parsed
+        with mock.patch('nsetools.nse.fetch_url', return_value=page), \
+                mock.patch('nsetools.nse.os.path.getmtime', side_effect=OSError), \
+                mock.patch('nsetools.nse.mkstemp', side_effect=PermissionError), \
+                mock.patch('nsetools.nse.datetime', frozen_datetime(datetime(2022, 12, 25, 10, 0))):
+            holiday_list = NseHolidays().get_holiday_list()
+        self.assertEqual(holiday_list, frozenset([date(2022, 12, 25), date(2022, 12, 26), date(2022, 12, 31)]))
+
+    def test_parse_holiday_list_cache_location(self):
+        # The cache goes to the cache directory of the user, never the shared temp directory
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch('nsetools.nse._CACHE_DIR', os.path.join(cache_dir, 'nsetools')), \
+                mock.patch('nsetools.nse.fetch_url', return_value=self.page) as fetch:
+            first = NseHolidays().__parse_holiday_list__()
+            self.assertListEqual(os.listdir(os.path.join(cache_dir, 'nsetools')),
+                                 ['nse_holidays_{}.json'.format(datetime.now().year)])
+            # A fresh instance reads it back without fetching
+            second = NseHolidays().__parse_holiday_list__()
+        self.assertEqual(fetch.call_count, 1)
+        self.assertListEqual(first, second)
+
+    def test_parse_holiday_list_unwritable_cache(self):
+        # A failing cache write must not fail the fetch
+        with mock.patch('nsetools.nse.fetch_url', return_value=self.page), \
+                mock.patch('nsetools.nse.os.path.getmtime', side_effect=OSError), \
+                mock.patch('nsetools.nse.mkstemp', side_effect=PermissionError):
+            holiday_list = NseHolidays().__parse_holiday_list__()
+        self.assertListEqual(holiday_list, [['1', '26-Dec-2022', 'Holiday']])
+
+class RedirectingHandler(BaseHTTPRequestHandler):
+    """
+    Stub server: /moved redirects to /quote, everything else returns a small body
+    """
+    def do_GET(self):
+        if self.path == '/moved':
+            self.send_response(301)
+            self.send_header('Location', '/quote')
+            self.end_headers()
+        else:
+            body = b'nsetools'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestNetUtils(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), RedirectingHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_read_urls_follows_redirects(self):
+        urls = [self.base_url + '/moved', self.base_url + '/quote']
+        responses = asyncio.run(read_urls(urls, {}))
+        self.assertEqual([res.read() for res in responses], ['nsetools', 'nsetools'])
+
+    def test_run_coroutine_inside_running_loop(self):
+        urls = [self.base_url + '/quote']
+        # Outside of a loop
+        responses = run_coroutine(read_urls(urls, {}))
+        self.assertEqual(responses[0].read(), 'nsetools')
+
+        # And from within one, like in Jupyter
+        async def caller():
+            return run_coroutine(read_urls(urls, {}))
+        responses = asyncio.run(caller())
+        self.assertEqual(responses[0].read(), 'nsetools')
+
 if __name__ == '__main__':
     unittest.main()